@@ -9,32 +9,133 @@ License: MIT
 """
 
 import os
+import sys
+import json
 import time
-from datetime import datetime
+import hashlib
+import logging
+import tempfile
+import asyncio
+import functools
+import multiprocessing
+from collections import namedtuple
+from urllib.parse import urlsplit
+import httpx
 from dotenv import load_dotenv
-from playwright.sync_api import sync_playwright
-
-# Load environment variables from .env file
-load_dotenv()
+from playwright.async_api import async_playwright, expect
+from playwright.async_api import Error as PlaywrightError
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 
 # ============================================
 # CONFIGURATION (from environment variables)
 # ============================================
-JIRA_BASE_URL = os.getenv('JIRA_BASE_URL')
-USERNAME = os.getenv('JIRA_USERNAME')
-PASSWORD = os.getenv('JIRA_PASSWORD')
-KEYS_FILE = os.getenv('KEYS_FILE', 'keys.txt')
+# Environment variables that must be set for a run, and the Config field each one fills
+REQUIRED = {
+    'JIRA_BASE_URL': 'jira_base_url',
+    'JIRA_USERNAME': 'username',
+    'JIRA_PASSWORD': 'password',
+}
+MAX_PROCESSES = 4  # more than this tends to trip Jira's rate limiting
+
+# Settings for one run, built by load_config()
+Config = namedtuple('Config', [
+    'jira_base_url', 'username', 'password', 'keys_file', 'touch_mode', 'concurrency',
+    'processes', 'recycle_every', 'headless', 'state_file', 'state_max_age_hours',
+    'block_assets', 'block_stylesheets', 'cache_static', 'static_cache_dir', 'cdp_url', 'profile_dir',
+    'browser_args', 'browse_url', 'worklog_url',
+])
+
+
+def env_number(name, default, parse=int):
+    """Read a numeric environment variable; the ValueError names the variable if it doesn't parse"""
+    value = os.getenv(name, default)
+    try:
+        return parse(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number, got {value!r}") from None
+
+
+def load_config():
+    """Load the .env file and read the configuration from environment variables.
+
+    Called at the start of a run rather than at import time, so the values always reflect
+    the environment the run actually starts with. Raises ValueError for a non-numeric setting.
+    """
+    # Load environment variables from .env file
+    load_dotenv()
+
+    jira_base_url = os.getenv('JIRA_BASE_URL')
+    touch_mode = os.getenv('TOUCH_MODE', 'rest')  # 'rest' (worklog API) or 'browser' (UI clicks)
+    # Chromium refuses to start its sandbox as root (e.g. in a container); keep it everywhere else
+    running_as_root = hasattr(os, 'geteuid') and os.geteuid() == 0
+    no_sandbox = os.getenv('NO_SANDBOX', '1' if running_as_root else '0') == '1'
+    return Config(
+        jira_base_url=jira_base_url,
+        username=os.getenv('JIRA_USERNAME'),
+        password=os.getenv('JIRA_PASSWORD'),
+        keys_file=os.getenv('KEYS_FILE', 'keys.txt'),
+        touch_mode=touch_mode,
+        # At least one worker: with none, every key would silently drop out of the keys file
+        concurrency=max(1, env_number('CONCURRENCY', '20' if touch_mode == 'rest' else '5')),
+        processes=max(1, min(env_number('PROCESSES', '1'), MAX_PROCESSES)),  # CONCURRENCY workers each
+        recycle_every=env_number('RECYCLE_EVERY', '100'),  # browser mode: fresh context every N keys (0 = never)
+        headless=os.getenv('HEADLESS', '1') == '1',  # set HEADLESS=0 to watch the browser (e.g. to debug 2FA)
+        state_file=os.getenv('STATE_FILE', 'jira_state.json'),  # saved cookies so later runs can skip login + 2FA
+        state_max_age_hours=env_number('STATE_MAX_AGE_HOURS', '12', float),
+        block_assets=os.getenv('BLOCK_ASSETS', '1') == '1',  # skip images/fonts/analytics on issue pages
+        # Off by default: the Log work flow clicks a positioned dropdown and modal that need CSS
+        block_stylesheets=os.getenv('BLOCK_STYLESHEETS', '0') == '1',
+        cache_static=os.getenv('CACHE_STATIC', '1') == '1',  # keep JS/CSS bundles on disk between issue pages
+        static_cache_dir=os.getenv('STATIC_CACHE_DIR', '.cache_static'),
+        cdp_url=os.getenv('CDP_URL'),  # e.g. http://127.0.0.1:9222 to reuse an already running Chromium
+        profile_dir=os.getenv('PROFILE_DIR'),  # e.g. ~/.jira_touch_profile to keep Chromium's cache + cookies
+        browser_args=BROWSER_ARGS + (['--no-sandbox'] if no_sandbox else []),
+        # Issue URL builders: bound str.format methods, so building a URL is a single call
+        browse_url=f'{jira_base_url}/browse/{{}}'.format,
+        worklog_url=f'{jira_base_url}/rest/api/2/issue/{{}}/worklog'.format,
+    )
+
+
+# Chromium flags that cut background work we don't need for automation
+BROWSER_ARGS = [
+    '--disable-gpu',
+    '--disable-dev-shm-usage',
+    '--disable-extensions',
+    '--disable-background-networking',
+]
+
+# Requests the "Log work" flow doesn't need; aborted when BLOCK_ASSETS is on
+# ('stylesheet' is added only with BLOCK_STYLESHEETS=1)
+BLOCKED_RESOURCE_TYPES = {'image', 'font', 'media'}
+BLOCKED_EXTENSIONS = ('.woff2', '.png', '.gif')
+
+# Locators for one page's "Log work" flow, built once by issue_locators()
+IssueLocators = namedtuple('IssueLocators', 'meatball_menu log_work_item error_alert time_input save_btn')
+
+# Static assets served from STATIC_CACHE_DIR when CACHE_STATIC is on
+CACHED_ASSETS = "**/*.{js,css,woff2,png}"
+# Headers that describe the original (possibly compressed) transfer, not the cached body
+UNCACHED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding'}
+
+
+# Per-key progress goes through a logger: safe to call from many workers at once
+logger = logging.getLogger('jira_touch')
+
+
+def setup_logging():
+    """Send progress log lines to stdout with a timestamp (safe to call more than once)"""
+    if logger.handlers:
+        # Already set up: calling it again must not print every line twice
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
 
 
-def validate_config():
+def validate_config(config):
     """Validate that all required environment variables are set"""
-    missing = []
-    if not JIRA_BASE_URL:
-        missing.append('JIRA_BASE_URL')
-    if not USERNAME:
-        missing.append('JIRA_USERNAME')
-    if not PASSWORD:
-        missing.append('JIRA_PASSWORD')
+    missing = [var for var, field in REQUIRED.items() if not getattr(config, field)]
     
     if missing:
         print("❌ Missing required environment variables:")
@@ -46,14 +147,16 @@ def validate_config():
 
 
 def load_keys_from_file(filename):
-    """Load keys from a text file (one key per line, ignoring comments and empty lines)"""
+    """Load keys from a text file (one key per line, ignoring comments, empty lines and duplicates)"""
     try:
+        # dict keeps first-seen order while dropping duplicate keys
+        keys = {}
         with open(filename, 'r') as f:
-            keys = [
-                line.strip() for line in f 
-                if line.strip() and not line.strip().startswith('#')
-            ]
-        return keys
+            for line in f:
+                key = line.strip()
+                if key and key[0] != '#':
+                    keys[key] = None
+        return list(keys)
     except FileNotFoundError:
         print(f"❌ File '{filename}' not found!")
         return []
@@ -80,128 +183,537 @@ def format_duration(seconds):
         return f"{secs}s"
 
 
-def touch_jira_issues():
+async def launch_browser(p, config):
+    """Connect to a running Chromium over CDP if CDP_URL is set, otherwise launch a new one"""
+    if config.cdp_url:
+        print(f"🔌 Connecting to Chromium at {config.cdp_url}...")
+        return await p.chromium.connect_over_cdp(config.cdp_url)
+    return await p.chromium.launch(headless=config.headless, slow_mo=0, args=config.browser_args)
+
+
+async def block_assets(blocked_types, route):
+    """Abort requests of the blocked resource types and analytics calls; let everything else through"""
+    request = route.request
+    if (request.resource_type in blocked_types
+            or urlsplit(request.url).path.endswith(BLOCKED_EXTENSIONS)
+            or 'analytics' in request.url):
+        await route.abort()
+    else:
+        # fallback() (not continue_()) so other route handlers still get a chance
+        await route.fallback()
+
+
+def read_cached_asset(path, headers_path):
+    """Return (body, headers) for a cached asset, or None if it isn't (fully) cached"""
+    try:
+        with open(headers_path, 'r') as f:
+            headers = json.load(f)
+        with open(path, 'rb') as f:
+            body = f.read()
+    except (OSError, ValueError):
+        return None
+    return body, headers
+
+
+def write_cached_asset(path, headers_path, body, headers):
+    """Store an asset and its headers, each via a unique temp file and an atomic rename.
+
+    Several processes may miss the same asset at once; whichever rename lands last wins, and
+    a write that fails leaves any other writer's copy in place. Raises OSError on failure.
+    """
+    # Headers first: a body on disk always has its headers next to it
+    for target, data in ((headers_path, json.dumps(headers).encode()), (path, body)):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, target)
+        except OSError:
+            # Don't leave partial temp files behind (e.g. on a full disk); the caller decides
+            os.remove(tmp_path)
+            raise
+
+
+async def cache_static(cache_dir, route):
+    """Serve a static asset from the on-disk cache, fetching and storing it on a miss"""
+    url = route.request.url
+    ext = os.path.splitext(urlsplit(url).path)[1]
+    # md5 only names the file; usedforsecurity=False keeps it available on FIPS builds
+    path = os.path.join(cache_dir, hashlib.md5(url.encode(), usedforsecurity=False).hexdigest() + ext)
+    headers_path = path + '.headers.json'
+
+    # File I/O runs in a thread so big JS bundles don't stall the other workers on this loop
+    cached = await asyncio.to_thread(read_cached_asset, path, headers_path)
+    if cached:
+        body, headers = cached
+        await route.fulfill(body=body, headers=headers)
+        return
+
+    try:
+        response = await route.fetch()
+    except PlaywrightError:
+        # e.g. a pipelined page navigated away mid-request; let Playwright handle it normally
+        await route.fallback()
+        return
+    if response.ok:
+        try:
+            body = await response.body()
+            headers = {k: v for k, v in response.headers.items() if k.lower() not in UNCACHED_HEADERS}
+            await asyncio.to_thread(write_cached_asset, path, headers_path, body, headers)
+        except (PlaywrightError, OSError):
+            # Caching is best effort: a full or read-only disk must not leave the request hanging
+            pass
+    await route.fulfill(response=response)
+
+
+async def open_issue(page, url):
+    """Navigate the page to an issue URL; returns as soon as the navigation commits.
+
+    The menu locator auto-waits for the page to render, so there's no need to wait for
+    domcontentloaded here and parsing overlaps with that wait instead.
+    """
+    try:
+        await page.goto(url, wait_until='commit', timeout=30000)
+    except PlaywrightTimeoutError:
+        # The page may still finish loading; the menu locator will wait for it or fail the key
+        pass
+
+
+def issue_locators(page):
+    """Build the locators used by the Log work flow once per page.
+
+    Locators are lazy and re-resolve against the current DOM on every action, so they stay
+    valid across navigations of the same page.
+    """
+    log_work_item = page.get_by_role("menuitem", name="Log work")
+    return IssueLocators(
+        meatball_menu=page.get_by_test_id("issue-meatball-menu.ui.dropdown-trigger.button"),
+        log_work_item=log_work_item,
+        # Only visible alerts count: Jira also keeps empty, hidden role=alert live regions around
+        error_alert=page.locator("[role=alert]:visible").first,
+        time_input=page.get_by_test_id("timelog-textfield-Time spent"),
+        save_btn=page.get_by_test_id("issue.common.component.log-time-modal.modal.footer.save-button"),
+    )
+
+
+async def log_work_on_page(locators, on_saved=None):
+    """Log 1 minute of work on the issue currently open in the locators' page.
+
+    `on_saved()` is called right after the save click, before waiting for the modal to close.
+    """
+    # Stop waiting as soon as either the menu item or a Jira error shows up
+    menu_or_error = locators.log_work_item.or_(locators.error_alert).first
+
+    # Keep clicking the meatball menu until it opens, backing off between tries. Each wait is
+    # short: a menu that is merely slow stays open, so later attempts keep waiting on it.
+    max_attempts = 5
+    for attempt in range(max_attempts):
+        # Only click a closed menu, so a retry never toggles an opening menu shut; retries
+        # force the click so a half-open menu overlay can't swallow it
+        if await locators.meatball_menu.get_attribute("aria-expanded", timeout=30000) != "true":
+            await locators.meatball_menu.click(force=attempt > 0, timeout=30000)
+
+        try:
+            await menu_or_error.wait_for(state="visible", timeout=2000)
+        except PlaywrightTimeoutError:
+            pass
+        # An alert alone doesn't fail the key: Jira also shows unrelated banners with that role
+        if await locators.log_work_item.is_visible():
+            break
+        if attempt < max_attempts - 1:
+            await asyncio.sleep(min(0.2 * 2 ** attempt, 2))
+    else:
+        message = f"Menu didn't open after {max_attempts} attempts"
+        if await locators.error_alert.count():
+            message += f" (Jira says: {await locators.error_alert.inner_text()})"
+        raise Exception(message)
+
+    # Click "Log work" menu item
+    await locators.log_work_item.click()
+
+    # Fill in time spent (1 minute)
+    await locators.time_input.fill("1m", timeout=10000)
+
+    # Click save button and wait for the modal to close
+    await locators.save_btn.click(timeout=10000)
+    if on_saved:
+        on_saved()
+    await expect(locators.time_input).to_be_hidden(timeout=10000)
+
+
+def create_api_client(cookies):
+    """Create an HTTP client for the Jira REST API that reuses the browser's session cookies"""
+    jar = httpx.Cookies()
+    for cookie in cookies:
+        jar.set(cookie['name'], cookie['value'], domain=cookie['domain'], path=cookie['path'])
+
+    return httpx.AsyncClient(
+        cookies=jar,
+        # Cookie-authenticated POSTs are rejected by Jira's XSRF check without this header
+        headers={'Accept': 'application/json', 'X-Atlassian-Token': 'no-check'},
+        timeout=30,
+        # httpx queues concurrent requests onto one HTTP/2 connection by itself: a single TLS
+        # handshake per run. If a proxy forces HTTP/1.1, the default pool still opens
+        # enough connections for every worker.
+        http2=True,
+    )
+
+
+async def log_work_via_api(client, worklog_url, key):
+    """Log 1 minute of work on a single issue through the Jira REST API (no page render)"""
+    response = await client.post(worklog_url(key), json={'timeSpent': '1m'})
+    if response.status_code != 201:
+        raise Exception(f"HTTP {response.status_code}: {response.text}")
+
+
+def make_reporter(total, failed_keys, done_f, fail_f):
+    """Return a callback that prints each key's result and appends it to the progress files"""
+    def report(i, key, error=None):
+        if error is None:
+            logger.info('[%d/%d] %s... ✓', i, total, key)
+            done_f.write(f"{key}\n")
+        else:
+            logger.info('[%d/%d] %s... ✗ (%s)', i, total, key, str(error)[:50])
+            failed_keys.append(key)
+            fail_f.write(f"{key}\n")
+    return report
+
+
+def next_item(queue):
+    """Take the next (index, key) off the queue, or None when it's empty"""
+    try:
+        return queue.get_nowait()
+    except asyncio.QueueEmpty:
+        return None
+
+
+async def worker(touch, queue, report, limit=None):
+    """Pull keys off the queue and touch each one with `touch(key)`; returns the success count.
+
+    Stops when the queue is empty or after `limit` keys, whichever comes first.
+    """
+    successful = 0
+    processed = 0
+    while limit is None or processed < limit:
+        item = next_item(queue)
+        if item is None:
+            break
+        i, key = item
+        processed += 1
+
+        try:
+            await touch(key)
+            report(i, key)
+            successful += 1
+        except Exception as e:
+            report(i, key, e)
+    return successful
+
+
+async def pipelined_worker(pages, queue, report, browse_url, limit=None):
+    """Touch issues through the UI on a pair of pages; returns the success count.
+
+    While one page saves its Log work modal, the other is already navigating to the next key,
+    so navigation overlaps with the modal closing instead of following it.
+    """
+    locators = [issue_locators(page) for page in pages]
+    successful = 0
+    processed = 0
+    item = next_item(queue)
+    navigation = asyncio.ensure_future(open_issue(pages[0], browse_url(item[1]))) if item else None
+
+    while item:
+        i, key = item
+        processed += 1
+        item = next_item(queue) if limit is None or processed < limit else None
+        upcoming = None
+
+        def prefetch():
+            nonlocal upcoming
+            if item and upcoming is None:
+                upcoming = asyncio.ensure_future(open_issue(pages[1], browse_url(item[1])))
+
+        try:
+            await navigation
+            await log_work_on_page(locators[0], on_saved=prefetch)
+            report(i, key)
+            successful += 1
+        except Exception as e:
+            report(i, key, e)
+
+        # If this key failed before saving, the next one still needs loading
+        prefetch()
+        navigation = upcoming
+        pages.reverse()
+        locators.reverse()
+    return successful
+
+
+async def setup_routes(context, config):
+    """Register the asset blocking/caching routes on a browser context"""
+    # Handlers run newest-first: block_assets decides, then falls back to the cache
+    if config.cache_static:
+        os.makedirs(config.static_cache_dir, exist_ok=True)
+        await context.route(CACHED_ASSETS, functools.partial(cache_static, config.static_cache_dir))
+    if config.block_assets:
+        blocked_types = BLOCKED_RESOURCE_TYPES | ({'stylesheet'} if config.block_stylesheets else set())
+        await context.route("**/*", functools.partial(block_assets, blocked_types))
+
+
+async def browser_worker(config, browser, context, state, queue, report):
+    """Run a worker that touches issues through the UI on its own pair of pages.
+
+    With a browser, the worker gets its own context (seeded from the logged-in session) and
+    replaces it every RECYCLE_EVERY keys, since Playwright holds on to every request/response
+    until the context closes. A persistent profile can't spawn contexts, so its pages share it.
+    """
+    successful = 0
+    while not queue.empty():
+        worker_context = context
+        if browser:
+            worker_context = await browser.new_context(storage_state=state)
+            await setup_routes(worker_context, config)
+        pages = [await worker_context.new_page(), await worker_context.new_page()]
+        try:
+            successful += await pipelined_worker(
+                pages, queue, report, config.browse_url, limit=config.recycle_every or None)
+        finally:
+            for page in pages:
+                await page.close()
+            if worker_context is not context:
+                # Carry any refreshed cookies over to the next context and the next run
+                state = await save_session(worker_context, config.state_file)
+                await worker_context.close()
+    return successful
+
+
+async def process_items(config, items, total, state, browser=None, context=None):
+    """Touch the given (index, key) items with CONCURRENCY workers; returns (successful, failed_keys).
+
+    `state` is the logged-in storage_state. Browser mode needs either a `browser` to create
+    contexts from or a persistent `context` to share.
+    """
+    queue = asyncio.Queue()
+    for item in items:
+        queue.put_nowait(item)
+    workers = min(config.concurrency, len(items))
+    failed_keys = []
+
+    # Line-buffered appends so every result is on disk even if the run crashes
+    with open(config.keys_file + '.done', 'a', buffering=1) as done_f, \
+            open(config.keys_file + '.failed', 'a', buffering=1) as fail_f:
+        report = make_reporter(total, failed_keys, done_f, fail_f)
+
+        if config.touch_mode == 'rest':
+            # Reuse the logged-in session for plain HTTP calls; no page renders per key
+            async with create_api_client(state['cookies']) as client:
+                touch = functools.partial(log_work_via_api, client, config.worklog_url)
+                counts = await asyncio.gather(*[
+                    worker(touch, queue, report)
+                    for _ in range(workers)
+                ])
+        else:
+            if not browser:
+                # Registered after login so the login form still renders normally
+                await setup_routes(context, config)
+            counts = await asyncio.gather(*[
+                browser_worker(config, browser, context, state, queue, report)
+                for _ in range(workers)
+            ])
+    return sum(counts), failed_keys
+
+
+async def process_shard(config, items, total, state):
+    """Touch one shard of keys with this process's own browser; returns (successful, failed_keys)"""
+    if config.touch_mode == 'rest':
+        return await process_items(config, items, total, state)
+
+    async with async_playwright() as p:
+        browser = await launch_browser(p, config)
+        try:
+            return await process_items(config, items, total, state, browser=browser)
+        finally:
+            await browser.close()
+
+
+def touch_shard(args):
+    """multiprocessing entry point: run process_shard() for one (config, items, total, state) shard"""
+    return asyncio.run(process_shard(*args))
+
+
+def load_saved_state(filename, max_age_hours):
+    """Return the saved session file if it exists and is recent enough to reuse, otherwise None"""
+    try:
+        age = time.time() - os.path.getmtime(filename)
+    except OSError:
+        return None
+    return filename if age < max_age_hours * 3600 else None
+
+
+async def save_session(context, filename):
+    """Write the context's storage_state to `filename` (owner-only, atomically); returns the state"""
+    state = await context.storage_state()
+    # mkstemp creates the file with 0600 permissions: it holds live session cookies
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)))
+    with os.fdopen(fd, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, filename)
+    return state
+
+
+async def is_logged_in(page, url):
+    """Open an issue URL and check that Jira didn't redirect to the login page"""
+    try:
+        await page.goto(url, wait_until='domcontentloaded', timeout=30000)
+        if 'id.atlassian.com' in page.url or '/login' in page.url:
+            return False
+        return not await page.get_by_test_id("username").is_visible()
+    except Exception:
+        return False
+
+
+async def login(page, config, first_key):
+    """Log in through the Atlassian login form, pausing for the manual 2FA code"""
+    # Username + password
+    print(f"\n📋 Logging in to Jira...")
+    await page.goto(config.browse_url(first_key), wait_until='domcontentloaded', timeout=30000)
+    
+    await page.get_by_test_id("username").click()
+    await page.get_by_test_id("username").fill(config.username)
+    await page.get_by_test_id("login-submit-idf-testid").click()
+    
+    await page.get_by_test_id("password").wait_for(state="visible", timeout=10000)
+    await page.get_by_test_id("password").fill(config.password)
+    await page.get_by_test_id("login-submit-idf-testid").click()
+    
+    # Verification code (manual entry)
+    print(f"\n🔐 Verification code required!")
+    
+    verification_field = page.get_by_label("-digit verification code")
+    await verification_field.wait_for(state="visible", timeout=30000)
+    
+    verification_code = input("   Enter your 6-digit verification code: ").strip()
+    
+    await verification_field.fill(verification_code)
+    
+    print(f"   ⏳ Waiting for login to complete...")
+    await asyncio.sleep(5)
+    
+    await page.goto(config.browse_url(first_key), wait_until='domcontentloaded', timeout=30000)
+    await asyncio.sleep(2)
+
+
+async def touch_jira_issues():
     """Main function to touch all Jira issues listed in the keys file"""
     
-    # Validate configuration
-    if not validate_config():
+    # Read and validate configuration
+    try:
+        config = load_config()
+    except ValueError as e:
+        print(f"❌ Invalid configuration: {e}")
+        return
+    if not validate_config(config):
         return
     
     # Load keys from file
-    keys = load_keys_from_file(KEYS_FILE)
+    keys = load_keys_from_file(config.keys_file)
     
     if not keys:
-        print(f"❌ No keys to process! Make sure '{KEYS_FILE}' exists and has keys.")
+        print(f"❌ No keys to process! Make sure '{config.keys_file}' exists and has keys.")
         return
 
-    print(f"📋 Loaded {len(keys)} keys from {KEYS_FILE}")
+    print(f"📋 Loaded {len(keys)} keys from {config.keys_file}")
+
+    # Progress files, written as we go so a crashed run can resume where it stopped
+    done_file = config.keys_file + '.done'
+    failed_file = config.keys_file + '.failed'
+
+    if os.path.exists(done_file):
+        done = set(load_keys_from_file(done_file))
+        keys = [key for key in keys if key not in done]
+        print(f"⏩ Resuming previous run: {len(done)} keys already done, {len(keys)} left")
+
+        if not keys:
+            save_keys_to_file(config.keys_file, [])
+            os.remove(done_file)
+            print(f"💾 All keys processed! {config.keys_file} is now empty.")
+            return
 
-    with sync_playwright() as p:
+    async with async_playwright() as p:
         print(f"🚀 Opening browser...")
         
-        browser = p.chromium.launch(headless=False, slow_mo=100)
-        context = browser.new_context()
-        page = context.new_page()
+        if config.profile_dir:
+            # The profile keeps Chromium's disk cache and cookies between runs
+            browser = None
+            context = await p.chromium.launch_persistent_context(
+                user_data_dir=os.path.expanduser(config.profile_dir),
+                headless=config.headless,
+                args=config.browser_args,
+            )
+            page = context.pages[0] if context.pages else await context.new_page()
+            # A brand-new profile has no cookies yet, so there's nothing to reuse
+            has_session = bool(await context.cookies())
+        else:
+            browser = await launch_browser(p, config)
+            saved_state = load_saved_state(config.state_file, config.state_max_age_hours)
+            context = await browser.new_context(storage_state=saved_state)
+            page = await context.new_page()
+            has_session = saved_state is not None
 
         try:
             # ============================================
-            # STEP 1: LOGIN
+            # STEP 1: LOGIN (reuse the saved session if it's still valid)
             # ============================================
-            print(f"\n📋 Logging in to Jira...")
-            page.goto(f"{JIRA_BASE_URL}/browse/{keys[0]}", wait_until='domcontentloaded', timeout=30000)
-            
-            page.get_by_test_id("username").click()
-            page.get_by_test_id("username").fill(USERNAME)
-            page.get_by_test_id("login-submit-idf-testid").click()
-            
-            page.get_by_test_id("password").wait_for(state="visible", timeout=10000)
-            page.get_by_test_id("password").fill(PASSWORD)
-            page.get_by_test_id("login-submit-idf-testid").click()
-            
-            # ============================================
-            # STEP 2: VERIFICATION CODE (manual entry)
-            # ============================================
-            print(f"\n🔐 Verification code required!")
-            
-            verification_field = page.get_by_label("-digit verification code")
-            verification_field.wait_for(state="visible", timeout=30000)
-            
-            verification_code = input("   Enter your 6-digit verification code: ").strip()
-            
-            verification_field.fill(verification_code)
-            
-            print(f"   ⏳ Waiting for login to complete...")
-            time.sleep(5)
-            
-            page.goto(f"{JIRA_BASE_URL}/browse/{keys[0]}", wait_until='domcontentloaded', timeout=30000)
-            time.sleep(2)
+            if has_session and await is_logged_in(page, config.browse_url(keys[0])):
+                print(f"\n🔑 Reusing saved session from {config.profile_dir or config.state_file}")
+                # Re-saved on reuse too, so the age check counts from the session's last use
+                state = await save_session(context, config.state_file)
+            else:
+                if has_session:
+                    print(f"\n⌛ Saved session expired, logging in again...")
+                    await context.clear_cookies()
+                await login(page, config, keys[0])
+                state = await save_session(context, config.state_file)
+                print(f"   💾 Session saved to {config.state_file}")
+            await page.close()
             
             # ============================================
-            # STEP 3: PROCESS ALL KEYS IN SAME SESSION
+            # STEP 2: PROCESS ALL KEYS IN PARALLEL (SAME SESSION)
             # ============================================
-            print(f"\n✅ Logged in! Starting to process {len(keys)} issues...\n")
-            successful = 0
-            failed = 0
-            failed_keys = []
+            items = list(enumerate(keys, 1))
+            workers = min(config.concurrency, len(keys))
+            processes = min(config.processes, len(keys))
+            if processes > 1:
+                print(f"\n✅ Logged in! Starting to process {len(keys)} issues ({processes} processes × {workers} in parallel)...\n")
+            else:
+                print(f"\n✅ Logged in! Starting to process {len(keys)} issues ({workers} in parallel)...\n")
             
-            # Start timer
-            start_time = datetime.now()
-
-            for i, key in enumerate(keys, 1):
-                try:
-                    print(f'[{i}/{len(keys)}] {key}...', end=' ', flush=True)
-                    
-                    # Navigate to the issue
-                    page.goto(f'{JIRA_BASE_URL}/browse/{key}', wait_until='domcontentloaded', timeout=30000)
-                    
-                    # Click the meatball menu with persistent retry
-                    meatball_menu = page.get_by_test_id("issue-meatball-menu.ui.dropdown-trigger.button")
-                    log_work_item = page.get_by_role("menuitem", name="Log work")
-                    
-                    # Keep clicking until the menu opens (max 10 attempts)
-                    max_attempts = 10
-                    for attempt in range(1, max_attempts + 1):
-                        meatball_menu.wait_for(state="visible", timeout=30000)
-                        meatball_menu.click()
-                        time.sleep(1.5)
-                        
-                        if log_work_item.is_visible():
-                            break
-                        else:
-                            # Press Escape to close any partial menu state
-                            page.keyboard.press("Escape")
-                            time.sleep(0.5)
-                    else:
-                        raise Exception(f"Menu didn't open after {max_attempts} attempts")
-                    
-                    # Click "Log work" menu item
-                    log_work_item.click()
-                    time.sleep(0.5)
-                    
-                    # Fill in time spent (1 minute)
-                    time_input = page.get_by_test_id("timelog-textfield-Time spent")
-                    time_input.wait_for(state="visible", timeout=10000)
-                    time_input.fill("1m")
-                    time.sleep(0.3)
-                    
-                    # Click save button
-                    save_btn = page.get_by_test_id("issue.common.component.log-time-modal.modal.footer.save-button")
-                    save_btn.wait_for(state="visible", timeout=10000)
-                    save_btn.click()
-                    time.sleep(1)
-                    
-                    print(f'✓')
-                    successful += 1
-                    
-                except Exception as e:
-                    print(f'✗ ({str(e)[:50]})')
-                    failed += 1
-                    failed_keys.append(key)
-                    continue
+            # Start timer (monotonic, so clock adjustments during long runs don't skew it)
+            start_time = time.monotonic()
+
+            # Results are appended by every worker; start this run's failures from scratch
+            open(failed_file, 'w').close()
+
+            if processes > 1:
+                # Each process takes every n-th key with its own browser, sharing the logged-in session
+                shards = [(config, items[n::processes], len(keys), state) for n in range(processes)]
+                # spawn, not fork: children mustn't inherit this running event loop, the Playwright
+                # driver's pipes or the log handlers; setup_logging() sets the handler up from scratch
+                with multiprocessing.get_context('spawn').Pool(processes, initializer=setup_logging) as pool:
+                    # Run the blocking map off the event loop so Playwright stays responsive
+                    results = await asyncio.get_running_loop().run_in_executor(None, pool.map, touch_shard, shards)
+                successful = sum(count for count, _ in results)
+                failed_keys = [key for _, shard_failed in results for key in shard_failed]
+            else:
+                successful, failed_keys = await process_items(config, items, len(keys), state, browser, context)
+            failed = len(failed_keys)
+
+            # Workers and shards finish out of order; keep failures in the keys file's order
+            order = {key: i for i, key in items}
+            failed_keys.sort(key=order.get)
 
             # End timer
-            end_time = datetime.now()
-            elapsed = (end_time - start_time).total_seconds()
+            elapsed = time.monotonic() - start_time
 
             # ============================================
             # SUMMARY
@@ -210,30 +722,36 @@ def touch_jira_issues():
             print(f'✅ DONE!')
             print(f'   Total time: {format_duration(elapsed)}')
             print(f'   Successful: {successful}/{len(keys)}')
+            # The run finished: failed keys (possibly none) become the new keys file
+            save_keys_to_file(failed_file, failed_keys)
+            os.replace(failed_file, config.keys_file)
+            os.remove(done_file)
             if failed > 0:
                 print(f'   Failed: {failed}/{len(keys)}')
                 print(f'\n❌ FAILED KEYS:')
                 for fk in failed_keys:
                     print(f'   - {fk}')
-                # Save failed keys back to the file (so you can re-run for just those)
-                save_keys_to_file(KEYS_FILE, failed_keys)
-                print(f'\n💾 Failed keys saved to {KEYS_FILE} (re-run to retry)')
+                print(f'\n💾 Failed keys saved to {config.keys_file} (re-run to retry)')
             else:
-                # All successful - clear the file
-                save_keys_to_file(KEYS_FILE, [])
-                print(f'\n💾 All keys processed! {KEYS_FILE} is now empty.')
+                print(f'\n💾 All keys processed! {config.keys_file} is now empty.')
             print(f'{"="*50}')
             
-            print(f'\n💡 Browser will close in 5 seconds...')
-            time.sleep(5)
+            if not config.headless:
+                # Leave a visible browser on screen for a moment; headless has nothing to see
+                print(f'\n💡 Browser will close in 5 seconds...')
+                await asyncio.sleep(5)
 
         except Exception as e:
             print(f'\n❌ Fatal error: {str(e)}')
             raise
         finally:
             print('\n🔒 Closing browser...')
-            browser.close()
+            if browser:
+                await browser.close()
+            else:
+                await context.close()
 
 
 if __name__ == '__main__':
-    touch_jira_issues()
+    setup_logging()
+    asyncio.run(touch_jira_issues())